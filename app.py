@@ -1,28 +1,29 @@
-from flask import Flask, render_template, request, redirect, url_for, session, send_file, flash
-import sqlite3, os, io, datetime
+from flask import Flask, render_template, request, redirect, url_for, session, send_file, flash, make_response
+from markupsafe import Markup
+import sqlite3, os, datetime, hashlib, glob, json, threading, time
 from werkzeug.security import generate_password_hash, check_password_hash
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-import json
-import pickle
-import numpy as np
-import nltk
-from nltk.stem import WordNetLemmatizer
-from tensorflow.keras.models import load_model
 from flask import jsonify
-
-lemmatizer = WordNetLemmatizer()
-model = load_model("chatbot_model.h5")
-
-words = pickle.load(open("words.pkl", "rb"))
-classes = pickle.load(open("classes.pkl", "rb"))
-
-with open("intents.json") as f:
-    intents = json.load(f)
+from chatbot import predict_class, get_response
+from jobs import enqueue, find_job, get_job, init_jobs, result_path, run_inline, JOB_TYPES
 
 app = Flask(__name__)
 app.secret_key = "123"
-DB_PATH = "database.db"
+app.config["FRAGMENT_CACHE"] = True
+# seconds a certificate download waits for the job worker before rendering the PDF itself
+CERTIFICATE_WAIT = 2.0
+DB_PATH = os.environ.get("DB_PATH", "database.db")
+
+def code_version():
+    # part of every ETag: identical in every worker process, changes only when the templates or this file do
+    h = hashlib.sha1()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted(glob.glob(os.path.join(here, "*.html"))) + [os.path.abspath(__file__)]:
+        h.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+CODE_VERSION = code_version()
 
 def db():
     conn = sqlite3.connect(DB_PATH)
@@ -48,11 +49,66 @@ def init_db():
     c.execute("create table if not exists enrollments(id integer primary key autoincrement,user_id integer,course_id integer,completed integer default 0,unique(user_id,course_id))")
     c.execute("create table if not exists questions(id integer primary key autoincrement,course_id integer,question text,option1 text,option2 text,option3 text,option4 text,answer integer)")
     c.execute("create table if not exists marks(id integer primary key autoincrement,user_id integer,course_id integer,score integer,created_at text)")
+    # one row per (user, course) holding the most recent attempt; marks keeps the full history
+    if not c.execute("select 1 from sqlite_master where type='table' and name='latest_marks'").fetchone():
+        c.execute("create table latest_marks(user_id integer,course_id integer,mark_id integer,score integer,created_at text,primary key(user_id,course_id))")
+        # backfill once, when the table is first created
+        c.execute("""insert into latest_marks(user_id,course_id,mark_id,score,created_at)
+            select m.user_id, m.course_id, m.id, m.score, m.created_at from marks m
+            join (select max(id) as id from marks group by user_id, course_id) l on l.id = m.id""")
+    # bumped on every change to courses so cached catalog fragments and ETags go stale
+    c.execute("create table if not exists catalog_version(version integer)")
+    c.execute("insert into catalog_version(version) select 0 where not exists (select 1 from catalog_version)")
+    init_jobs(conn)
     aptitude_courses = [
         ("Logical Aptitude", "Develop logical reasoning skills essential for aptitude tests", "/static/videos/logical.mp4", "Aptitude", 0),
         ("Quantitative Aptitude", "Master quantitative and mathematical problem-solving", "/static/videos/quantitative.mp4", "Aptitude", 1),
         ("Communication Aptitude", "Enhance verbal and communication abilities for assessments", "/static/videos/communication.mp4", "Aptitude", 2)
     ]
+    conn.commit()
+    conn.close()
+
+init_db()
+
+def catalog_version(conn):
+    row = conn.execute("select version from catalog_version").fetchone()
+    return row[0] if row else 0
+
+def bump_catalog_version(conn):
+    conn.execute("update catalog_version set version = version + 1")
+
+_fragments = {"version": None, "items": {}}
+_fragments_lock = threading.Lock()
+
+def fragment(version, key, render):
+    # catalog-only HTML, rendered once per catalog version and shared by every user
+    if not app.config["FRAGMENT_CACHE"]:
+        return Markup(render())
+    with _fragments_lock:
+        if _fragments["version"] is None or _fragments["version"] < version:
+            _fragments["version"] = version
+            _fragments["items"] = {}
+        # a request that read an older version than the cache holds must not write into it
+        items = _fragments["items"] if _fragments["version"] == version else None
+    if items is None:
+        return Markup(render())
+    html = items.get(key)
+    if html is None:
+        html = items[key] = Markup(render())
+    return html
+
+def conditional_page(etag_parts, render, flashes=False):
+    # pages that show flashed messages must render to consume them
+    if flashes and session.get("_flashes"):
+        return render()
+    etag = hashlib.sha1(repr((CODE_VERSION,) + tuple(etag_parts)).encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+    else:
+        resp = make_response(render())
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
 
 def current_user():
     if "user_id" in session:
@@ -69,51 +125,14 @@ def is_aptitude_completed(user_id):
         conn.close()
         return True
     completed = True
-    total_score = 0
-    count = 0
     for ac in apt_courses:
-        mark = conn.execute("select score from marks where user_id=? and course_id=? order by id desc limit 1", (user_id, ac['id'])).fetchone()
-        if mark:
-            total_score += mark['score']
-            count += 1
+        mark = conn.execute("select score from latest_marks where user_id=? and course_id=?", (user_id, ac['id'])).fetchone()
         if not mark or mark['score'] < 10:
             completed = False
             break
-    common_aptitude_score = total_score / max(count, 1) if count > 0 else 0
-    conn.execute("CREATE TABLE IF NOT EXISTS aptitude_scores (user_id INTEGER PRIMARY KEY, common_score REAL)")
-    conn.execute("INSERT OR REPLACE INTO aptitude_scores (user_id, common_score) VALUES (?, ?)", (user_id, common_aptitude_score))
-    conn.commit()
     conn.close()
     return completed
 
-def clean_up_sentence(sentence):
-    sentence_words = nltk.word_tokenize(sentence)
-    sentence_words = [lemmatizer.lemmatize(w.lower()) for w in sentence_words]
-    return sentence_words
-
-def bow(sentence, words):
-    sentence_words = clean_up_sentence(sentence)
-    bag = [1 if w in sentence_words else 0 for w in words]
-    return np.array(bag)
-
-def predict_class(sentence):
-    p = bow(sentence, words)
-    res = model.predict(np.array([p]))[0]
-    ERROR_THRESHOLD = 0.1
-    results = [[i, r] for i, r in enumerate(res) if r > ERROR_THRESHOLD]
-    results.sort(key=lambda x: x[1], reverse=True)
-    return [{"intent": classes[r[0]], "probability": str(r[1])} for r in results]
-
-def get_response(ints):
-    if len(ints) == 0:
-        return "I am not sure how to answer that."
-    tag = ints[0]["intent"]
-    list_of_intents = intents["intents"]
-    for i in list_of_intents:
-        if i["tag"] == tag:
-            return np.random.choice(i["responses"])
-    return "I am not sure how to answer that."
-
 @app.route("/")
 def index():
     return render_template("index.html", user=current_user())
@@ -124,18 +143,14 @@ def student_index():
     if not u:
         return redirect(url_for("index"))
     conn = db()
+    # read before the page data, so a concurrent admin edit can only make this version look stale, never hide
+    version = catalog_version(conn)
     all_courses_query = conn.execute("select c.*, e.id as enrolled, e.completed from courses c left join enrollments e on e.course_id=c.id and e.user_id=? order by c.order_index ASC", (u["id"],)).fetchall()
     
     all_courses = [dict(row) for row in all_courses_query]
     
-    last_marks = {}
-    seen_courses = set()
-    mark_rows = conn.execute("select course_id, score from marks where user_id=? order by created_at desc", (u["id"],)).fetchall()
-    for row in mark_rows:
-        cid = row['course_id']
-        if cid not in seen_courses:
-            last_marks[cid] = row['score']
-            seen_courses.add(cid)
+    mark_rows = conn.execute("select course_id, score from latest_marks where user_id=?", (u["id"],)).fetchall()
+    last_marks = {row['course_id']: row['score'] for row in mark_rows}
     
     for c in all_courses:
         c['last_score'] = last_marks.get(c['id'])
@@ -169,9 +184,14 @@ def student_index():
     
     aptitude_done = all_apt_passed or is_aptitude_completed(u['id'])  # Fallback to existing function
     aptitude_progress = (num_apt_enrolled / len(aptitude_courses) * 100) if aptitude_courses else 0
-    
     conn.close()
-    return render_template("student_index.html", user=u, aptitude_courses=aptitude_courses, non_aptitude_courses=non_aptitude_courses, aptitude_done=aptitude_done, aptitude_progress=aptitude_progress, aptitude_details=aptitude_details)
+
+    etag_parts = (version, u["id"], u["name"], aptitude_done, aptitude_progress,
+                  [(c['id'], c['enrolled'], c['completed'], c['last_score']) for c in all_courses])
+    def render():
+        course_cards = {c['id']: fragment(version, ("course_card", c['id']), lambda c=c: render_template("_course_card.html", c=c)) for c in all_courses}
+        return render_template("student_index.html", user=u, aptitude_courses=aptitude_courses, non_aptitude_courses=non_aptitude_courses, aptitude_done=aptitude_done, aptitude_progress=aptitude_progress, aptitude_details=aptitude_details, course_cards=course_cards)
+    return conditional_page(etag_parts, render, flashes=True)
 
 @app.route("/register", methods=["POST"])
 def register():
@@ -232,11 +252,19 @@ def admin_dashboard():
     if not session.get("admin"):
         return redirect(url_for("index"))
     conn = db()
-    it = conn.execute("select * from courses where category='IT' order by order_index ASC").fetchall()
-    biz = conn.execute("select * from courses where category='Business' order by order_index ASC").fetchall()
-    apt = conn.execute("select * from courses where category='Aptitude' order by order_index ASC").fetchall()
+    version = catalog_version(conn)
     conn.close()
-    return render_template("admin_dashboard.html", it_courses=it, biz_courses=biz, apt_courses=apt)
+
+    def course_lists():
+        conn = db()
+        it = conn.execute("select * from courses where category='IT' order by order_index ASC").fetchall()
+        biz = conn.execute("select * from courses where category='Business' order by order_index ASC").fetchall()
+        apt = conn.execute("select * from courses where category='Aptitude' order by order_index ASC").fetchall()
+        conn.close()
+        return render_template("_admin_course_lists.html", it_courses=it, biz_courses=biz, apt_courses=apt)
+    def render():
+        return render_template("admin_dashboard.html", course_lists=fragment(version, "admin_course_lists", course_lists))
+    return conditional_page((version,), render)
 
 @app.route("/admin/course/new", methods=["POST"])
 def admin_add_course():
@@ -265,6 +293,7 @@ def admin_add_course():
         "INSERT INTO courses(title,description,video_url,category,order_index) VALUES(?,?,?,?,?)",
         (title, description, video_url, category, next_index)
     )
+    bump_catalog_version(conn)
     conn.commit()
     conn.close()
     flash("Course added","success")
@@ -313,6 +342,7 @@ def admin_update_course():
     else:
         conn.execute("UPDATE courses SET title=?, description=?, category=? WHERE id=?",
                      (title, description, category, course_id))
+    bump_catalog_version(conn)
     conn.commit()
     conn.close()
     flash("Course updated successfully", "success")
@@ -327,6 +357,7 @@ def admin_delete_course(course_id):
     conn.execute("DELETE FROM courses WHERE id=?", (course_id,))
     conn.execute("DELETE FROM questions WHERE course_id=?", (course_id,))
     conn.execute("DELETE FROM enrollments WHERE course_id=?", (course_id,))
+    bump_catalog_version(conn)
     conn.commit()
     conn.close()
     flash("Course deleted", "success")
@@ -341,6 +372,7 @@ def admin_save_course_order():
     conn = db()
     for idx, cid in enumerate(course_ids):
         conn.execute("UPDATE courses SET order_index=? WHERE id=? AND category=?", (idx, cid, category))
+    bump_catalog_version(conn)
     conn.commit()
     conn.close()
 
@@ -378,6 +410,7 @@ def clean_duplicates():
             c.execute("DELETE FROM questions WHERE course_id=?", (cid,))
             c.execute("DELETE FROM enrollments WHERE course_id=?", (cid,))
             c.execute("DELETE FROM marks WHERE course_id=?", (cid,))
+            c.execute("DELETE FROM latest_marks WHERE course_id=?", (cid,))
             c.execute("DELETE FROM courses WHERE id=?", (cid,))
         
        
@@ -389,6 +422,7 @@ def clean_duplicates():
                     c.execute("DELETE FROM questions WHERE course_id=?", (cid,))
                     c.execute("DELETE FROM enrollments WHERE course_id=?", (cid,))
                     c.execute("DELETE FROM marks WHERE course_id=?", (cid,))
+                    c.execute("DELETE FROM latest_marks WHERE course_id=?", (cid,))
                     c.execute("DELETE FROM courses WHERE id=?", (cid,))
         
         for category in ["IT", "Business", "Aptitude"]:
@@ -396,6 +430,7 @@ def clean_duplicates():
             for idx, course in enumerate(cat_courses):
                 c.execute("UPDATE courses SET order_index=? WHERE id=?", (idx, course['id']))
         
+        bump_catalog_version(conn)
         conn.commit()
         conn.close()
         conn = db()
@@ -552,7 +587,7 @@ def quiz(course_id):
         return redirect(url_for("student_index"))
     qs = conn.execute("select * from questions where course_id=? order by id", (course_id,)).fetchall()
     course = conn.execute("select * from courses where id=?", (course_id,)).fetchone()
-    last_mark = conn.execute("select * from marks where user_id=? and course_id=? order by id desc limit 1",(u["id"],course_id)).fetchone()
+    last_mark = conn.execute("select * from latest_marks where user_id=? and course_id=?",(u["id"],course_id)).fetchone()
     conn.close()
     return render_template("quiz.html", user=u, course=course, questions=qs, last_mark=last_mark)
 
@@ -569,7 +604,13 @@ def submit_quiz(course_id):
         val = request.form.get(key)
         if val and int(val) == q["answer"]:
             score += 1
-    conn.execute("insert into marks(user_id,course_id,score,created_at) values(?,?,?,?)",(u["id"],course_id,score,datetime.datetime.utcnow().isoformat()))
+    created_at = datetime.datetime.utcnow().isoformat()
+    cur = conn.execute("insert into marks(user_id,course_id,score,created_at) values(?,?,?,?)",(u["id"],course_id,score,created_at))
+    conn.execute("insert or replace into latest_marks(user_id,course_id,mark_id,score,created_at) values(?,?,?,?,?)",(u["id"],course_id,cur.lastrowid,score,created_at))
+    course = conn.execute("select category from courses where id=?", (course_id,)).fetchone()
+    if course and course["category"] == "Aptitude":
+        # the stored common score only changes with aptitude marks; repeat submits share one queued job
+        enqueue(conn, "aptitude_score", {"user_id": u["id"]}, user_id=u["id"], dedupe_key=str(u["id"]))
     conn.commit()
     conn.close()
     return redirect(url_for("certificate", course_id=course_id))
@@ -581,16 +622,13 @@ def certificate(course_id):
         return redirect(url_for("index"))
     conn = db()
     course = conn.execute("select * from courses where id=?", (course_id,)).fetchone()
-    mark = conn.execute("select * from marks where user_id=? and course_id=? order by id desc limit 1",(u["id"],course_id)).fetchone()
+    mark = conn.execute("select * from latest_marks where user_id=? and course_id=?",(u["id"],course_id)).fetchone()
     conn.close()
     if not course or not mark:
         return redirect(url_for("student_index"))
     eligible = mark["score"] >= 10
     return render_template("certificate.html", user=u, course=course, mark=mark, eligible=eligible)
 
-from reportlab.lib.colors import HexColor
-from reportlab.lib.units import cm
-
 @app.route("/certificate/<int:course_id>/download")
 def download_certificate(course_id):
     u = current_user()
@@ -600,94 +638,105 @@ def download_certificate(course_id):
     conn = db()
     course = conn.execute("SELECT * FROM courses WHERE id=?", (course_id,)).fetchone()
     mark = conn.execute(
-        "SELECT * FROM marks WHERE user_id=? AND course_id=? ORDER BY id DESC LIMIT 1",
+        "SELECT * FROM latest_marks WHERE user_id=? AND course_id=?",
         (u["id"], course_id)
     ).fetchone()
-    conn.close()
 
     if not course or not mark or mark["score"] < 10:
+        conn.close()
         return redirect(url_for("certificate", course_id=course_id))
 
-    buf = io.BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
-    w, h = A4
-
-
-    c.setFillColor(HexColor("#fffdf6"))
-    c.rect(0, 0, w, h, fill=1, stroke=0)
-
-    
-    c.setFont("Helvetica-Bold", 80)
-    c.setFillColor(HexColor("#f0e6d6"))
-    for y in range(100, int(h), 200):
-        for x in range(100, int(w), 200):
-            c.drawCentredString(x, y, "★")
-
-    
-    margin = 2*cm
-    c.setStrokeColor(HexColor("#d4af37"))
-    c.setLineWidth(4)
-    c.rect(margin, margin, w-2*margin, h-2*margin, stroke=1, fill=0)
-
-    
-    for i, color in enumerate(["#ffd700", "#ffc200", "#ffae00"]):
-        c.setFillColor(HexColor(color))
-        c.roundRect(w/2 - 130, h-150+i*5, 260, 15, 7, fill=1, stroke=0)
-
-    
-    c.setFont("Helvetica-Bold", 28)
-    c.setFillColor(HexColor("#b8860b"))
-    c.drawCentredString(w/2 + 2, h-142, "Certificate of Completion")
-    c.setFillColor(HexColor("#ffffff"))
-    c.drawCentredString(w/2, h-140, "Certificate of Completion")
-
-    
-    c.setFont("Helvetica", 14)
-    c.setFillColor(HexColor("#333333"))
-    c.drawCentredString(w/2, h-180, "This certifies that")
-
-    c.setFont("Helvetica-Bold", 26)
-    c.setFillColor(HexColor("#b8860b"))
-    c.drawCentredString(w/2, h-220, u["name"])
-
-    
-    c.setFont("Helvetica", 16)
-    c.setFillColor(HexColor("#333333"))
-    c.drawCentredString(w/2, h-255, "has successfully completed the course")
-
-    c.setFont("Helvetica-BoldOblique", 20)
-    c.setFillColor(HexColor("#8b0000"))
-    c.drawCentredString(w/2, h-285, course["title"])
-
-
-    c.setFont("Helvetica", 12)
-    c.setFillColor(HexColor("#555555"))
-    c.drawCentredString(w/2, h-320, f"Date: {datetime.datetime.now().strftime('%Y-%m-%d')}")
+    # rendered by the job worker; a PDF already built for this attempt is reused
+    key = f"{u['id']}:{course_id}:{mark['mark_id']}"
+    job = find_job(conn, "certificate_pdf", key)
+    if job is not None and job["status"] == "done" and not os.path.exists(result_path(job["id"])):
+        job = None
+    if job is None:
+        job_id = enqueue(conn, "certificate_pdf", {"name": u["name"], "course_title": course["title"], "filename": f"certificate_{course_id}.pdf"},
+                         user_id=u["id"], dedupe_key=key)
+        conn.commit()
+        job = get_job(conn, job_id)
+    job_id = job["id"]
+
+    # give the worker a moment; if none picks the job up, render it in this request
+    deadline = time.time() + CERTIFICATE_WAIT
+    while job is not None and job["status"] in ("queued", "running") and time.time() < deadline:
+        time.sleep(0.2)
+        job = get_job(conn, job_id)
+    if job is not None and job["status"] == "queued" and run_inline(conn, job_id, DB_PATH):
+        job = get_job(conn, job_id)
+    conn.close()
 
+    if job is None:
+        # removed by the worker's cleanup in the meantime; start over
+        return redirect(url_for("download_certificate", course_id=course_id))
+    if job["status"] == "done" and os.path.exists(result_path(job_id)):
+        return send_job_file(job)
+    # still running on a busy worker, or failed; the page refreshes itself while pending
+    status = 500 if job["status"] == "failed" else 202
+    return render_template("certificate_pending.html", course=course, job=job), status
+
+def send_job_file(job):
+    filename = json.loads(job["payload"]).get("filename", f"job_{job['id']}")
+    return send_file(os.path.abspath(result_path(job["id"])), as_attachment=True, download_name=filename, mimetype=job["result_type"])
+
+def job_owner_ok(job):
+    if session.get("admin"):
+        return True
+    u = current_user()
+    return u is not None and job["user_id"] == u["id"]
 
-    c.setLineWidth(1.5)
-    c.line(80, 120, w/2-40, 120)
-    c.line(w/2+40, 120, w-80, 120)
-    c.setFont("Helvetica-Oblique", 10)
-    c.drawCentredString((80 + w/2-40)/2, 110, "Instructor")
-    c.drawCentredString((w/2+40 + w-80)/2, 110, "Authorized Signature")
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    if not session.get("admin"):
+        return jsonify({"error": "admin access required"}), 403
+    data = request.get_json() or {}
+    job_type = data.get("type")
+    if job_type not in JOB_TYPES:
+        return jsonify({"error": "unknown job type"}), 400
+    conn = db()
+    job_id = enqueue(conn, job_type, data.get("payload", {}), dedupe_key=data.get("dedupe_key"))
+    conn.commit()
+    conn.close()
+    return jsonify({"job_id": job_id, "status_url": url_for("job_status", job_id=job_id)}), 202
 
-    
-    c.setStrokeColor(HexColor("#d4af37"))
-    c.setLineWidth(2)
-    seal_x, seal_y = w-80, h-180
-    c.circle(seal_x, seal_y, 40, stroke=1, fill=0)
-    for angle in range(0, 360, 36):
-        rad = angle * 3.1416 / 180
-        x2 = seal_x + 30 * cm * 0.01 * 3 * (0.5**0.5)
-        y2 = seal_y
-        c.line(seal_x, seal_y, x2, y2)
-
-    c.showPage()
-    c.save()
-    buf.seek(0)
-
-    return send_file(buf, as_attachment=True, download_name=f"certificate_{course_id}.pdf", mimetype="application/pdf")
+@app.route("/jobs/<int:job_id>")
+def job_status(job_id):
+    conn = db()
+    job = get_job(conn, job_id)
+    conn.close()
+    if not job or not job_owner_ok(job):
+        return jsonify({"error": "job not found"}), 404
+    return jsonify({
+        "job_id": job["id"],
+        "type": job["type"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "result_url": url_for("job_result", job_id=job["id"]) if job["status"] == "done" else None
+    })
+
+@app.route("/jobs/<int:job_id>/result")
+def job_result(job_id):
+    conn = db()
+    job = get_job(conn, job_id)
+    conn.close()
+    if not job or not job_owner_ok(job):
+        return jsonify({"error": "job not found"}), 404
+    if job["status"] == "failed":
+        return jsonify({"status": "failed", "error": job["error"]}), 500
+    if job["status"] != "done":
+        resp = jsonify({"status": job["status"], "status_url": url_for("job_status", job_id=job_id)})
+        resp.status_code = 202
+        resp.headers["Retry-After"] = "1"
+        return resp
+    if job["result_type"] == "application/json":
+        return app.response_class(job["result"], mimetype="application/json")
+    if not os.path.exists(result_path(job_id)):
+        return jsonify({"error": "job result expired"}), 404
+    return send_job_file(job)
 
 @app.route("/chatbot", methods=["POST"])
 def chatbot_response():
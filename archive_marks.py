@@ -0,0 +1,60 @@
+import argparse
+import datetime
+import sqlite3
+import time
+
+DB_PATH = "database.db"
+ARCHIVE_PATH = "marks_archive.db"
+
+
+def archive_old_marks(db_path=DB_PATH, archive_path=ARCHIVE_PATH, keep_days=30, batch_size=500, pause=0.0):
+    """Move superseded quiz attempts from marks into the archive database.
+
+    The latest attempt for every (user, course) is never moved, since it is
+    what latest_marks points at. Work is done in small batches so the web app
+    is only ever blocked for one short write transaction at a time.
+    """
+    cutoff = (datetime.datetime.utcnow() - datetime.timedelta(days=keep_days)).isoformat()
+    conn = sqlite3.connect(db_path)
+    conn.execute("attach database ? as archive", (archive_path,))
+    conn.execute("create table if not exists archive.marks(id integer primary key,user_id integer,course_id integer,score integer,created_at text)")
+    conn.commit()
+    moved = 0
+    # walk marks in id order so each batch continues from the last one instead of rescanning the table
+    last_id = 0
+    while True:
+        ids = [row[0] for row in conn.execute(
+            """select id from main.marks
+               where id > ? and created_at < ? and id not in (select mark_id from main.latest_marks)
+               order by id limit ?""", (last_id, cutoff, batch_size)).fetchall()]
+        if not ids:
+            break
+        last_id = ids[-1]
+        placeholders = ",".join("?" * len(ids))
+        conn.execute(f"insert or ignore into archive.marks select id,user_id,course_id,score,created_at from main.marks where id in ({placeholders})", ids)
+        conn.execute(f"delete from main.marks where id in ({placeholders})", ids)
+        conn.commit()
+        moved += len(ids)
+        if pause:
+            time.sleep(pause)
+    conn.execute("detach database archive")
+    conn.close()
+    return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old quiz attempts out of the marks table")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--archive", default=ARCHIVE_PATH)
+    parser.add_argument("--keep-days", type=int, default=30, help="keep attempts newer than this many days")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument("--vacuum", action="store_true", help="reclaim freed pages in the main database afterwards")
+    args = parser.parse_args()
+
+    moved = archive_old_marks(args.db, args.archive, args.keep_days, args.batch_size, args.pause)
+    print(moved, "marks archived to", args.archive)
+    if args.vacuum:
+        conn = sqlite3.connect(args.db)
+        conn.execute("vacuum")
+        conn.close()
@@ -0,0 +1,166 @@
+"""Single-file chatbot model format that can be memory-mapped by every worker.
+
+Layout (little endian, every section starts on an 8 byte boundary):
+
+    header   magic "CBMA", version, word count, class count, layer count (uint32)
+    words    uint32 offsets[n + 1] followed by the UTF-8 blob, sorted
+    classes  same string table layout, in model output order
+    layers   per Dense layer: in_dim, out_dim, activation (uint32), padding,
+             float32 kernel[in_dim * out_dim] (row major), float32 bias[out_dim]
+
+Nothing is unpickled at load time; the arrays are read-only views straight
+onto the mapping, so the OS shares the pages between processes.
+"""
+import mmap
+import os
+import struct
+import numpy as np
+
+MAGIC = b"CBMA"
+VERSION = 1
+ARTIFACT_PATH = "chatbot_model.bin"
+ACTIVATIONS = ["linear", "relu", "softmax"]
+
+_HEADER = struct.Struct("<4sIIII")
+_LAYER = struct.Struct("<IIII")
+
+
+def _pad(n):
+    return -n % 8
+
+
+def _string_table(strings):
+    blobs = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(blobs) + 1, dtype="<u4")
+    offsets[1:] = np.cumsum([len(b) for b in blobs])
+    data = offsets.tobytes() + b"".join(blobs)
+    return data + b"\0" * _pad(len(data))
+
+
+def write_artifact(path, words, classes, layers):
+    """Write words, classes and [(kernel, bias, activation), ...] to path."""
+    words = list(words)
+    if words != sorted(words):
+        raise ValueError("vocabulary must be sorted")
+    parts = [_HEADER.pack(MAGIC, VERSION, len(words), len(classes), len(layers))]
+    parts.append(b"\0" * _pad(_HEADER.size))
+    parts.append(_string_table(words))
+    parts.append(_string_table(classes))
+    for kernel, bias, activation in layers:
+        kernel = np.ascontiguousarray(kernel, dtype="<f4")
+        bias = np.ascontiguousarray(bias, dtype="<f4")
+        parts.append(_LAYER.pack(kernel.shape[0], kernel.shape[1], ACTIVATIONS.index(activation), 0))
+        data = kernel.tobytes() + bias.tobytes()
+        parts.append(data + b"\0" * _pad(len(data)))
+    # write next to the target and rename, so workers that already mapped
+    # the old file keep reading a consistent copy
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(b"".join(parts))
+    os.replace(tmp, path)
+
+
+def export_model(path, words, classes, model):
+    """Export the Dense layers of a trained Keras model; Dropout is a no-op at inference."""
+    layers = []
+    for layer in model.layers:
+        weights = layer.get_weights()
+        if not weights:
+            continue
+        kernel, bias = weights
+        layers.append((kernel, bias, layer.get_config()["activation"]))
+    write_artifact(path, words, classes, layers)
+
+
+class StringTable:
+    """Read-only list of strings backed by the mapped file."""
+
+    def __init__(self, buf, offset, count):
+        self._buf = buf
+        self._offsets = np.frombuffer(buf, dtype="<u4", count=count + 1, offset=offset)
+        self._blob = offset + 4 * (count + 1)
+        self.nbytes = 4 * (count + 1) + int(self._offsets[-1])
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("string table index out of range")
+        start = self._blob + int(self._offsets[i])
+        end = self._blob + int(self._offsets[i + 1])
+        return bytes(self._buf[start:end]).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __contains__(self, value):
+        return any(s == value for s in self)
+
+    def index(self, value):
+        # only valid for sorted tables (the vocabulary)
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self[lo] == value:
+            return lo
+        raise ValueError(f"{value!r} is not in table")
+
+
+class Artifact:
+    def __init__(self, path=ARTIFACT_PATH):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_words, n_classes, n_layers = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} chatbot artifact")
+        pos = _HEADER.size + _pad(_HEADER.size)
+        self.words = StringTable(self._mm, pos, n_words)
+        pos += self.words.nbytes + _pad(self.words.nbytes)
+        self.classes = StringTable(self._mm, pos, n_classes)
+        pos += self.classes.nbytes + _pad(self.classes.nbytes)
+        self.layers = []
+        for _ in range(n_layers):
+            in_dim, out_dim, activation, _ = _LAYER.unpack_from(self._mm, pos)
+            pos += _LAYER.size
+            kernel = np.frombuffer(self._mm, dtype="<f4", count=in_dim * out_dim, offset=pos).reshape(in_dim, out_dim)
+            pos += kernel.nbytes
+            bias = np.frombuffer(self._mm, dtype="<f4", count=out_dim, offset=pos)
+            pos += bias.nbytes + _pad(kernel.nbytes + bias.nbytes)
+            self.layers.append((kernel, bias, ACTIVATIONS[activation]))
+
+    def predict(self, x, batch_size=None, verbose=None):
+        # same call shape as keras Model.predict so callers need not care which backend loaded
+        x = np.asarray(x, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            x = x @ kernel + bias
+            if activation == "relu":
+                x = np.maximum(x, 0)
+            elif activation == "softmax":
+                x = np.exp(x - x.max(axis=-1, keepdims=True))
+                x /= x.sum(axis=-1, keepdims=True)
+        return x
+
+
+if __name__ == "__main__":
+    # convert the files produced by older train.py runs
+    import pickle
+    from tensorflow.keras.models import load_model
+    from pattern_index import rebuild_index, INDEX_PATH
+
+    words = pickle.load(open("words.pkl", "rb"))
+    classes = pickle.load(open("classes.pkl", "rb"))
+    export_model(ARTIFACT_PATH, words, classes, load_model("chatbot_model.h5"))
+    print("wrote", ARTIFACT_PATH)
+
+    # the low-confidence fallback index is rebuilt from intents.json against the same vocabulary;
+    # `python pattern_index.py` does only this step
+    rebuild_index(words, classes)
+    print("wrote", INDEX_PATH)
@@ -0,0 +1,65 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from werkzeug.security import generate_password_hash
+
+
+def timed_get(client, url, headers=None):
+    start = time.perf_counter()
+    resp = client.get(url, headers=headers or {})
+    return time.perf_counter() - start, resp.status_code
+
+
+def measure(client, app, url, n, warmup=20):
+    """Average ms per request for full render, fragment-cached and 304 responses.
+
+    Every mode is warmed up first and the modes are then interleaved request by
+    request, so template compilation and cache warmth are not charged to one mode.
+    """
+    etag = client.get(url).headers["ETag"]
+    modes = [("full", False, None), ("cached", True, None), ("304", True, {"If-None-Match": etag})]
+    totals = dict.fromkeys([name for name, _, _ in modes], 0.0)
+    for i in range(warmup + n):
+        for name, cache, headers in modes:
+            app.config["FRAGMENT_CACHE"] = cache
+            elapsed, status = timed_get(client, url, headers)
+            assert status == (304 if headers else 200)
+            if i >= warmup:
+                totals[name] += elapsed
+    app.config["FRAGMENT_CACHE"] = True
+    return [totals[name] / n * 1000 for name, _, _ in modes]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full, fragment-cached and conditional page rendering")
+    parser.add_argument("-n", type=int, default=200, help="requests per measurement")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per mode before timing")
+    args = parser.parse_args()
+
+    # work on a copy so the benchmark user never lands in the real database; the path has to be
+    # set before the import, since importing the app runs init_db
+    tmp = tempfile.mkdtemp()
+    os.environ["DB_PATH"] = os.path.join(tmp, "database.db")
+    shutil.copy("database.db", os.environ["DB_PATH"])
+    import app as webapp
+
+    conn = webapp.db()
+    conn.execute("insert or ignore into users(name,email,password) values(?,?,?)",
+                 ("Bench", "bench@example.com", generate_password_hash("bench")))
+    conn.commit()
+    user_id = conn.execute("select id from users where email=?", ("bench@example.com",)).fetchone()["id"]
+    conn.close()
+
+    client = webapp.app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = user_id
+        s["admin"] = True
+
+    print(f"{'page':<10}{'full render':>14}{'fragments':>12}{'304':>10}")
+    for url in ["/student", "/admin"]:
+        full, cached, conditional = measure(client, webapp.app, url, args.n, args.warmup)
+        print(f"{url:<10}{full:>11.3f} ms{cached:>9.3f} ms{conditional:>7.3f} ms")
+
+    shutil.rmtree(tmp)
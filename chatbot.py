@@ -0,0 +1,84 @@
+import json
+import os
+import warnings
+import numpy as np
+import nltk
+from nltk.stem import WordNetLemmatizer
+from artifact import Artifact, ARTIFACT_PATH
+from pattern_index import PatternIndex, INDEX_PATH, vocabulary_fingerprint
+
+lemmatizer = WordNetLemmatizer()
+
+if os.path.exists(ARTIFACT_PATH):
+    # memory-mapped, so every worker on the host shares one read-only copy
+    model = Artifact(ARTIFACT_PATH)
+    words = model.words
+    classes = model.classes
+else:
+    # models trained before chatbot_model.bin existed; run `python artifact.py` to convert
+    warnings.warn(f"{ARTIFACT_PATH} not found, loading chatbot_model.h5 and the vocabulary pickles "
+                  "in every worker; run `python artifact.py` to convert them")
+    import pickle
+    from tensorflow.keras.models import load_model
+    model = load_model("chatbot_model.h5")
+    words = pickle.load(open("words.pkl", "rb"))
+    classes = pickle.load(open("classes.pkl", "rb"))
+
+with open("intents.json") as f:
+    intents = json.load(f)
+
+pattern_index = PatternIndex(INDEX_PATH) if os.path.exists(INDEX_PATH) else None
+if pattern_index is None:
+    warnings.warn(f"{INDEX_PATH} not found, low-confidence fallback disabled; "
+                  "run `python pattern_index.py` to build it")
+elif pattern_index.fingerprint != vocabulary_fingerprint(words, classes):
+    # built for a different vocabulary or class list, i.e. stale after retraining
+    warnings.warn(f"{INDEX_PATH} does not match the loaded model, low-confidence fallback disabled; "
+                  "run `python pattern_index.py` to rebuild it")
+    pattern_index = None
+FALLBACK_THRESHOLD = 0.5
+
+def clean_up_sentence(sentence):
+    sentence_words = nltk.word_tokenize(sentence)
+    sentence_words = [lemmatizer.lemmatize(w.lower()) for w in sentence_words]
+    return sentence_words
+
+def bag_of_words(sentence_words, words):
+    # look each sentence word up in the vocabulary rather than scanning the whole vocabulary
+    bag = np.zeros(len(words), dtype=int)
+    for w in sentence_words:
+        try:
+            bag[words.index(w)] = 1
+        except ValueError:
+            pass
+    return bag
+
+def bow(sentence, words):
+    return bag_of_words(clean_up_sentence(sentence), words)
+
+def predict_class(sentence):
+    p = bow(sentence, words)
+    res = model.predict(np.array([p]))[0]
+    ERROR_THRESHOLD = 0.1
+    results = [[i, r] for i, r in enumerate(res) if r > ERROR_THRESHOLD]
+    results.sort(key=lambda x: x[1], reverse=True)
+    if not results:
+        return nearest_patterns(p)
+    return [{"intent": classes[r[0]], "probability": str(r[1])} for r in results]
+
+def nearest_patterns(p, k=3):
+    # low-confidence fallback: classes of the intents.json patterns most similar to the bag p
+    if pattern_index is None:
+        return []
+    return [{"intent": classes[tag], "similarity": str(score), "fallback": True}
+            for tag, score in pattern_index.query(p, k) if score >= FALLBACK_THRESHOLD]
+
+def get_response(ints):
+    if len(ints) == 0:
+        return "I am not sure how to answer that."
+    tag = ints[0]["intent"]
+    list_of_intents = intents["intents"]
+    for i in list_of_intents:
+        if i["tag"] == tag:
+            return np.random.choice(i["responses"])
+    return "I am not sure how to answer that."
@@ -0,0 +1,116 @@
+import argparse
+import json
+import time
+import numpy as np
+
+import chatbot
+from chatbot import clean_up_sentence, bag_of_words, bow, predict_class
+
+
+def load_heldout(path):
+    # {"tag": ["utterance", ...], ...}
+    with open(path) as f:
+        data = json.load(f)
+    return [(text, tag) for tag, texts in data.items() for text in texts]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def latency_summary(samples):
+    ms = np.array(samples) * 1000
+    return {
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def evaluate_accuracy(samples):
+    # runs each utterance through the same functions the /chatbot route uses; the stages
+    # are timed one after another on each other's output, end_to_end is a separate full call
+    confusion = {}
+    correct = 0
+    stages = {"clean_up_sentence": [], "bag_of_words": [], "model": []}
+    end_to_end = []
+    errors = []
+    for text, tag in samples:
+        sentence_words, t = timed(clean_up_sentence, text)
+        stages["clean_up_sentence"].append(t)
+        p, t = timed(bag_of_words, sentence_words, chatbot.words)
+        stages["bag_of_words"].append(t)
+        _, t = timed(lambda x: chatbot.model.predict(x, verbose=0), np.array([p]))
+        stages["model"].append(t)
+        ints, t = timed(predict_class, text)
+        end_to_end.append(t)
+
+        predicted = ints[0]["intent"] if ints else "<none>"
+        row = confusion.setdefault(tag, {})
+        row[predicted] = row.get(predicted, 0) + 1
+        if predicted == tag:
+            correct += 1
+        else:
+            errors.append({"text": text, "expected": tag, "predicted": predicted})
+    return {
+        "samples": len(samples),
+        "accuracy": correct / max(len(samples), 1),
+        "stage_latency": {name: latency_summary(v) for name, v in stages.items()},
+        "end_to_end_latency": latency_summary(end_to_end),
+        "confusion": confusion,
+        "errors": errors,
+    }
+
+
+def throughput(texts, batch_sizes, seconds):
+    # sustained messages/second with bow() per message and one model call per batch
+    results = {}
+    for size in batch_sizes:
+        batch = [texts[i % len(texts)] for i in range(size)]
+        done = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            x = np.array([bow(text, chatbot.words) for text in batch])
+            chatbot.model.predict(x, verbose=0)
+            done += size
+        elapsed = time.perf_counter() - start
+        results[str(size)] = {"messages": done, "seconds": elapsed, "messages_per_second": done / elapsed}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate and benchmark the chatbot intent classifier")
+    parser.add_argument("--data", default="eval_utterances.json", help="held-out utterances keyed by intent tag")
+    parser.add_argument("--batch-sizes", default="1,8,32,128")
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each throughput run")
+    parser.add_argument("--json", dest="json_out", help="write the full report to this file")
+    args = parser.parse_args()
+
+    samples = load_heldout(args.data)
+    unknown = sorted({tag for _, tag in samples if tag not in chatbot.classes})
+    if unknown:
+        print("warning: tags not known to the model:", unknown)
+
+    report = evaluate_accuracy(samples)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b]
+    report["throughput"] = throughput([text for text, _ in samples], batch_sizes, args.seconds)
+    report["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    report["vocabulary_size"] = len(chatbot.words)
+    report["classes"] = len(chatbot.classes)
+
+    print(f"accuracy: {report['accuracy']:.3f} ({report['samples']} utterances)")
+    for name, s in report["stage_latency"].items():
+        print(f"  {name:<18} mean {s['mean_ms']:.3f} ms  p95 {s['p95_ms']:.3f} ms")
+    s = report["end_to_end_latency"]
+    print(f"  {'end to end':<18} mean {s['mean_ms']:.3f} ms  p95 {s['p95_ms']:.3f} ms")
+    for size, t in report["throughput"].items():
+        print(f"  batch {size:>4}: {t['messages_per_second']:.1f} msg/s")
+    for e in report["errors"]:
+        print(f"  miss: {e['text']!r} expected {e['expected']} got {e['predicted']}")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
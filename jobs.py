@@ -0,0 +1,370 @@
+"""Small local job queue: a jobs table in the app's SQLite database plus a
+worker process pool. No broker; start the worker next to the web app with
+
+    python jobs.py --workers 4
+
+Route handlers call enqueue() and return straight away; the worker claims
+queued rows, runs them in the pool (at most `concurrency` per job type at a
+time), stores the result and retries failures with exponential backoff.
+run_inline() lets a request run a job itself when no worker picks it up.
+Binary results (PDFs) are written to RESULT_DIR rather than the database,
+and finished jobs are deleted, with their files, after JOB_TTL seconds.
+"""
+import argparse
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.colors import HexColor
+from reportlab.lib.units import cm
+
+DB_PATH = os.environ.get("DB_PATH", "database.db")
+RESULT_DIR = "job_results"
+JOB_TTL = 24 * 3600
+CLEANUP_INTERVAL = 600
+
+JOB_TYPES = {}
+
+
+def job_type(name, concurrency=1, max_attempts=3, mimetype="application/json"):
+    # handlers take (payload, db_path) and return bytes or something JSON serialisable
+    def register(fn):
+        JOB_TYPES[name] = {"fn": fn, "concurrency": concurrency, "max_attempts": max_attempts, "mimetype": mimetype}
+        return fn
+    return register
+
+
+def now():
+    return datetime.datetime.utcnow().isoformat()
+
+
+def init_jobs(conn):
+    conn.execute("""create table if not exists jobs(
+        id integer primary key autoincrement,
+        type text,
+        payload text,
+        user_id integer,
+        dedupe_key text,
+        status text default 'queued',
+        attempts integer default 0,
+        max_attempts integer default 3,
+        run_after real default 0,
+        result blob,
+        result_type text,
+        error text,
+        created_at text,
+        updated_at text
+    )""")
+    # at most one queued job per (type, dedupe_key); NULL keys never collide
+    conn.execute("create unique index if not exists jobs_queued on jobs(type, dedupe_key) where status='queued'")
+    conn.execute("create index if not exists jobs_status on jobs(status, run_after)")
+
+
+def enqueue(conn, job, payload, user_id=None, dedupe_key=None):
+    """Queue a job and return its id; the caller commits. A matching queued job is reused."""
+    if job not in JOB_TYPES:
+        raise ValueError(f"unknown job type {job!r}")
+    cur = conn.execute(
+        "insert or ignore into jobs(type,payload,user_id,dedupe_key,status,max_attempts,created_at,updated_at) values(?,?,?,?,'queued',?,?,?)",
+        (job, json.dumps(payload), user_id, dedupe_key, JOB_TYPES[job]["max_attempts"], now(), now()))
+    if cur.rowcount:
+        return cur.lastrowid
+    return conn.execute("select id from jobs where type=? and dedupe_key=? and status='queued'", (job, dedupe_key)).fetchone()[0]
+
+
+def find_job(conn, job, dedupe_key):
+    # latest job for the key that has not given up, so finished results can be reused
+    return conn.execute("select * from jobs where type=? and dedupe_key=? and status!='failed' order by id desc limit 1",
+                        (job, dedupe_key)).fetchone()
+
+
+def get_job(conn, job_id):
+    return conn.execute("select * from jobs where id=?", (job_id,)).fetchone()
+
+
+def result_path(job_id):
+    return os.path.join(RESULT_DIR, f"{job_id}.bin")
+
+
+def cleanup_jobs(conn, ttl=JOB_TTL):
+    """Delete done and failed jobs not touched for ttl seconds, with their result files."""
+    cutoff = (datetime.datetime.utcnow() - datetime.timedelta(seconds=ttl)).isoformat()
+    ids = [row[0] for row in conn.execute("select id from jobs where status in ('done','failed') and updated_at < ?", (cutoff,)).fetchall()]
+    for job_id in ids:
+        if os.path.exists(result_path(job_id)):
+            os.remove(result_path(job_id))
+    conn.executemany("delete from jobs where id=?", [(job_id,) for job_id in ids])
+    conn.commit()
+    return len(ids)
+
+
+def _requeue(conn, job_id, status_error, run_after):
+    # another queued job with the same dedupe key makes this one redundant
+    cur = conn.execute("update or ignore jobs set status='queued', run_after=?, error=?, updated_at=? where id=?",
+                       (run_after, status_error, now(), job_id))
+    if not cur.rowcount:
+        conn.execute("update jobs set status='failed', error=?, updated_at=? where id=?",
+                     ((status_error or "") + " (superseded)", now(), job_id))
+
+
+def _retry_or_fail(conn, job_id, job, attempts, error):
+    if attempts < JOB_TYPES[job]["max_attempts"]:
+        _requeue(conn, job_id, error, time.time() + 2 ** attempts)
+    else:
+        conn.execute("update jobs set status='failed', error=?, updated_at=? where id=?", (error, now(), job_id))
+
+
+def _store_result(conn, job_id, job, result):
+    if isinstance(result, bytes):
+        os.makedirs(RESULT_DIR, exist_ok=True)
+        tmp = result_path(job_id) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(result)
+        os.replace(tmp, result_path(job_id))
+        data, result_type = None, JOB_TYPES[job]["mimetype"]
+    else:
+        data, result_type = json.dumps(result), "application/json"
+    conn.execute("update jobs set status='done', result=?, result_type=?, error=null, updated_at=? where id=?",
+                 (data, result_type, now(), job_id))
+
+
+def _new_pool(workers):
+    # spawn rather than fork: SQLite connections must not be carried into child processes
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _restart_pool(pool, conn, running, error, workers):
+    # a worker process died, so every future on this pool fails; retry their jobs on a fresh pool
+    for job_id, job, attempts in running.values():
+        _retry_or_fail(conn, job_id, job, attempts, error)
+    running.clear()
+    conn.commit()
+    pool.shutdown(wait=False, cancel_futures=True)
+    return _new_pool(workers)
+
+
+def execute(job, payload, db_path):
+    return JOB_TYPES[job]["fn"](payload, db_path)
+
+
+def run_inline(conn, job_id, db_path=DB_PATH):
+    """Claim a job that is still queued and run it in this process.
+
+    For requests that cannot wait for a worker, e.g. when none is running.
+    Returns False if a worker claimed the job first.
+    """
+    cur = conn.execute("update jobs set status='running', attempts=attempts+1, updated_at=? where id=? and status='queued'",
+                       (now(), job_id))
+    conn.commit()
+    if not cur.rowcount:
+        return False
+    job = conn.execute("select type, payload, attempts from jobs where id=?", (job_id,)).fetchone()
+    try:
+        result = execute(job[0], json.loads(job[1]), db_path)
+    except Exception as e:
+        _retry_or_fail(conn, job_id, job[0], job[2], f"{type(e).__name__}: {e}")
+    else:
+        _store_result(conn, job_id, job[0], result)
+    conn.commit()
+    return True
+
+
+def run_worker(db_path=DB_PATH, workers=4, poll=0.5, ttl=JOB_TTL):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    init_jobs(conn)
+    # jobs left running by a worker that died
+    for row in conn.execute("select id from jobs where status='running'").fetchall():
+        _requeue(conn, row["id"], "worker restarted", 0)
+    conn.commit()
+
+    running = {}
+    pool = _new_pool(workers)
+    last_cleanup = 0
+    try:
+        while True:
+            if time.time() - last_cleanup >= CLEANUP_INTERVAL:
+                cleanup_jobs(conn, ttl)
+                last_cleanup = time.time()
+
+            broken = None
+            for fut in [f for f in running if f.done()]:
+                try:
+                    result = fut.result()
+                except BrokenProcessPool as e:
+                    broken = e
+                    break
+                except Exception as e:
+                    job_id, job, attempts = running.pop(fut)
+                    _retry_or_fail(conn, job_id, job, attempts, f"{type(e).__name__}: {e}")
+                else:
+                    job_id, job, attempts = running.pop(fut)
+                    _store_result(conn, job_id, job, result)
+                conn.commit()
+            if broken:
+                pool = _restart_pool(pool, conn, running, f"BrokenProcessPool: {broken}", workers)
+
+            in_flight = Counter(job for _, job, _ in running.values())
+            free = workers - len(running)
+            if free:
+                rows = conn.execute("select id, type, payload, attempts from jobs where status='queued' and run_after<=? order by id limit ?",
+                                    (time.time(), free * 4)).fetchall()
+                for row in rows:
+                    if len(running) >= workers:
+                        break
+                    spec = JOB_TYPES.get(row["type"])
+                    if spec is None:
+                        conn.execute("update jobs set status='failed', error='unknown job type', updated_at=? where id=?", (now(), row["id"]))
+                        continue
+                    if in_flight[row["type"]] >= spec["concurrency"]:
+                        continue
+                    cur = conn.execute("update jobs set status='running', attempts=attempts+1, updated_at=? where id=? and status='queued'",
+                                       (now(), row["id"]))
+                    conn.commit()
+                    if not cur.rowcount:
+                        continue
+                    try:
+                        fut = pool.submit(execute, row["type"], json.loads(row["payload"]), db_path)
+                    except BrokenProcessPool as e:
+                        _retry_or_fail(conn, row["id"], row["type"], row["attempts"] + 1, f"BrokenProcessPool: {e}")
+                        pool = _restart_pool(pool, conn, running, f"BrokenProcessPool: {e}", workers)
+                        break
+                    running[fut] = (row["id"], row["type"], row["attempts"] + 1)
+                    in_flight[row["type"]] += 1
+                conn.commit()
+
+            if running:
+                wait(list(running), timeout=poll, return_when=FIRST_COMPLETED)
+            else:
+                time.sleep(poll)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# job handlers
+
+@job_type("certificate_pdf", concurrency=2, mimetype="application/pdf")
+def certificate_pdf(payload, db_path):
+    return render_certificate(payload["name"], payload["course_title"])
+
+
+@job_type("aptitude_score", concurrency=4)
+def aptitude_score(payload, db_path):
+    user_id = payload["user_id"]
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    apt_courses = conn.execute("select id from courses where category='Aptitude'").fetchall()
+    total_score = 0
+    count = 0
+    for ac in apt_courses:
+        mark = conn.execute("select score from latest_marks where user_id=? and course_id=?", (user_id, ac['id'])).fetchone()
+        if mark:
+            total_score += mark['score']
+            count += 1
+        if not mark or mark['score'] < 10:
+            break
+    common_aptitude_score = total_score / max(count, 1) if count > 0 else 0
+    conn.execute("CREATE TABLE IF NOT EXISTS aptitude_scores (user_id INTEGER PRIMARY KEY, common_score REAL)")
+    conn.execute("INSERT OR REPLACE INTO aptitude_scores (user_id, common_score) VALUES (?, ?)", (user_id, common_aptitude_score))
+    conn.commit()
+    conn.close()
+    return {"user_id": user_id, "common_score": common_aptitude_score}
+
+
+def render_certificate(name, course_title):
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    w, h = A4
+
+
+    c.setFillColor(HexColor("#fffdf6"))
+    c.rect(0, 0, w, h, fill=1, stroke=0)
+
+    
+    c.setFont("Helvetica-Bold", 80)
+    c.setFillColor(HexColor("#f0e6d6"))
+    for y in range(100, int(h), 200):
+        for x in range(100, int(w), 200):
+            c.drawCentredString(x, y, "★")
+
+    
+    margin = 2*cm
+    c.setStrokeColor(HexColor("#d4af37"))
+    c.setLineWidth(4)
+    c.rect(margin, margin, w-2*margin, h-2*margin, stroke=1, fill=0)
+
+    
+    for i, color in enumerate(["#ffd700", "#ffc200", "#ffae00"]):
+        c.setFillColor(HexColor(color))
+        c.roundRect(w/2 - 130, h-150+i*5, 260, 15, 7, fill=1, stroke=0)
+
+    
+    c.setFont("Helvetica-Bold", 28)
+    c.setFillColor(HexColor("#b8860b"))
+    c.drawCentredString(w/2 + 2, h-142, "Certificate of Completion")
+    c.setFillColor(HexColor("#ffffff"))
+    c.drawCentredString(w/2, h-140, "Certificate of Completion")
+
+    
+    c.setFont("Helvetica", 14)
+    c.setFillColor(HexColor("#333333"))
+    c.drawCentredString(w/2, h-180, "This certifies that")
+
+    c.setFont("Helvetica-Bold", 26)
+    c.setFillColor(HexColor("#b8860b"))
+    c.drawCentredString(w/2, h-220, name)
+
+    
+    c.setFont("Helvetica", 16)
+    c.setFillColor(HexColor("#333333"))
+    c.drawCentredString(w/2, h-255, "has successfully completed the course")
+
+    c.setFont("Helvetica-BoldOblique", 20)
+    c.setFillColor(HexColor("#8b0000"))
+    c.drawCentredString(w/2, h-285, course_title)
+
+
+    c.setFont("Helvetica", 12)
+    c.setFillColor(HexColor("#555555"))
+    c.drawCentredString(w/2, h-320, f"Date: {datetime.datetime.now().strftime('%Y-%m-%d')}")
+
+
+    c.setLineWidth(1.5)
+    c.line(80, 120, w/2-40, 120)
+    c.line(w/2+40, 120, w-80, 120)
+    c.setFont("Helvetica-Oblique", 10)
+    c.drawCentredString((80 + w/2-40)/2, 110, "Instructor")
+    c.drawCentredString((w/2+40 + w-80)/2, 110, "Authorized Signature")
+
+    
+    c.setStrokeColor(HexColor("#d4af37"))
+    c.setLineWidth(2)
+    seal_x, seal_y = w-80, h-180
+    c.circle(seal_x, seal_y, 40, stroke=1, fill=0)
+    for angle in range(0, 360, 36):
+        rad = angle * 3.1416 / 180
+        x2 = seal_x + 30 * cm * 0.01 * 3 * (0.5**0.5)
+        y2 = seal_y
+        c.line(seal_x, seal_y, x2, y2)
+
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the background job worker")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--poll", type=float, default=0.5, help="seconds between polls when idle")
+    parser.add_argument("--ttl", type=float, default=JOB_TTL, help="seconds to keep finished jobs and their results")
+    args = parser.parse_args()
+    run_worker(args.db, args.workers, args.poll, args.ttl)
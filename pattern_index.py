@@ -0,0 +1,84 @@
+"""Nearest-pattern lookup used when the model is not confident about any class.
+
+Every training pattern is stored as its bag-of-words vector packed into a
+bitset row. A query only has a handful of words set, so the overlap with
+every pattern is computed one query word at a time by pulling that bit out
+of all rows at once; the cost grows with the number of patterns and query
+words, not with the vocabulary size.
+"""
+import hashlib
+import os
+import numpy as np
+
+INDEX_PATH = "pattern_index.npz"
+
+
+def vocabulary_fingerprint(words, classes):
+    # identifies the exact vocabulary and class order the bag bits and tags refer to
+    return hashlib.sha1(("\n".join(words) + "\0" + "\n".join(classes)).encode("utf-8")).hexdigest()
+
+
+def build_index(path, bags, tags, words, classes):
+    """Save packed pattern bags and their class indices (positions in classes)."""
+    bags = np.array(bags, dtype=bool)
+    bits = np.packbits(bags, axis=1)
+    counts = bags.sum(axis=1).astype(np.int32)
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, bits=bits, counts=counts, tags=np.array(tags, dtype=np.int32),
+             fingerprint=np.array(vocabulary_fingerprint(words, classes)))
+    os.replace(tmp, path)
+
+
+class PatternIndex:
+    def __init__(self, path=INDEX_PATH):
+        data = np.load(path)
+        # column-major so pulling one vocabulary bit out of every pattern reads contiguous memory
+        self.bits = np.asfortranarray(data["bits"])
+        self.counts = np.maximum(data["counts"], 1)
+        self.tags = data["tags"]
+        self.fingerprint = str(data["fingerprint"]) if "fingerprint" in data else None
+
+    def __len__(self):
+        return len(self.tags)
+
+    def query(self, bag, k=3):
+        """Return up to k (class index, cosine similarity) pairs, best first, one per class."""
+        indices = np.flatnonzero(bag)
+        if len(indices) == 0 or len(self) == 0:
+            return []
+        overlap = np.zeros(len(self), dtype=np.int32)
+        for j in indices:
+            overlap += (self.bits[:, j >> 3] >> (7 - (j & 7))) & 1
+        scores = overlap / np.sqrt(self.counts * len(indices))
+        # several patterns usually share a class, so look at a few more than k candidates
+        m = min(len(self), k * 8)
+        candidates = np.argpartition(-scores, m - 1)[:m]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        results = []
+        for i in candidates:
+            if scores[i] <= 0 or len(results) == k:
+                break
+            tag = int(self.tags[i])
+            if all(tag != t for t, _ in results):
+                results.append((tag, float(scores[i])))
+        return results
+
+
+def rebuild_index(words, classes, intents_path="intents.json", path=INDEX_PATH):
+    """Rebuild the index from intents.json against an existing vocabulary; no model needed."""
+    import json
+    from train import download_nltk_data, load_documents, build_training
+
+    download_nltk_data()
+    with open(intents_path) as f:
+        training = build_training(load_documents(json.load(f)), list(words), list(classes))
+    build_index(path, [t[0] for t in training], [t[1].index(1) for t in training], words, classes)
+
+
+if __name__ == "__main__":
+    # words and classes come from the served artifact, so this works without TensorFlow
+    from artifact import Artifact, ARTIFACT_PATH
+
+    artifact = Artifact(ARTIFACT_PATH)
+    rebuild_index(artifact.words, artifact.classes)
+    print("wrote", INDEX_PATH)
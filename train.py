@@ -1,102 +1,256 @@
-import tensorflow
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import pickle
 import random
-from tensorflow.keras.optimizers import SGD
-from keras.layers import Dense, Dropout
-from keras.models import load_model
-from keras.models import Sequential
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import pickle
-import json
 import nltk
 from nltk.stem import WordNetLemmatizer
+from artifact import Artifact, export_model, ARTIFACT_PATH
+from pattern_index import build_index, INDEX_PATH
 
 lemmatizer = WordNetLemmatizer()
-nltk.download('omw-1.4')
-nltk.download("punkt")
-nltk.download("wordnet")
+ignore_words = ["?", "!"]
 
+# hyperparameter grid for --sweep; hidden is the list of Dense layer sizes before the softmax
+SWEEP_GRID = {
+    "learning_rate": [0.001, 0.01, 0.05],
+    "dropout": [0.2, 0.5],
+    "hidden": [(128, 64), (64, 32), (64,), (32,)],
+    "batch_size": [5, 16],
+}
 
 
-words = []
-classes = []
-documents = []
-ignore_words = ["?", "!"]
-data_file = open("intents.json").read()
-intents = json.loads(data_file)
+def download_nltk_data():
+    nltk.download('omw-1.4')
+    nltk.download("punkt")
+    nltk.download("wordnet")
 
 
-for intent in intents["intents"]:
-    for pattern in intent["patterns"]:
+def tokenize_pattern(item):
+    pattern, tag = item
+    w = nltk.word_tokenize(pattern)
+    # lemmatize each word - create base word, in attempt to represent related words
+    return w, [lemmatizer.lemmatize(word.lower()) for word in w], tag
 
-    
-        w = nltk.word_tokenize(pattern)
-        words.extend(w)
-        # adding documents
-        documents.append((w, intent["tag"]))
 
-        # adding classes to our class list
-        if intent["tag"] not in classes:
-            classes.append(intent["tag"])
+def load_documents(intents, workers=1):
+    items = [(pattern, intent["tag"]) for intent in intents["intents"] for pattern in intent["patterns"]]
+    if workers > 1:
+        # tokenizing and lemmatizing is pure Python, so spread it over processes
+        with multiprocessing.get_context("spawn").Pool(workers) as pool:
+            return pool.map(tokenize_pattern, items, chunksize=max(1, len(items) // (workers * 4)))
+    return [tokenize_pattern(item) for item in items]
 
-words = [lemmatizer.lemmatize(w.lower()) for w in words if w not in ignore_words]
-words = sorted(list(set(words)))
 
-classes = sorted(list(set(classes)))
+def build_vocabulary(documents):
+    words = [lemmatizer.lemmatize(w.lower()) for tokens, _, _ in documents for w in tokens if w not in ignore_words]
+    words = sorted(list(set(words)))
+    classes = sorted(list(set(tag for _, _, tag in documents)))
+    return words, classes
 
-print(len(documents), "documents")
 
-print(len(classes), "classes", classes)
+def build_training(documents, words, classes):
+    training = []
+    output_empty = [0] * len(classes)
+    for _, pattern_words, tag in documents:
+        # create our bag of words array with 1, if word match found in current pattern
+        pattern_words = set(pattern_words)
+        bag = [1 if w in pattern_words else 0 for w in words]
 
-print(len(words), "unique lemmatized words", words)
+        # output is a '0' for each tag and '1' for current tag (for each pattern)
+        output_row = list(output_empty)
+        output_row[classes.index(tag)] = 1
 
+        training.append([bag, output_row])
+    return training
 
-pickle.dump(words, open("words.pkl", "wb"))
-pickle.dump(classes, open("classes.pkl", "wb"))
 
+def build_model(input_dim, output_dim, hidden=(128, 64), dropout=0.5, learning_rate=0.001):
+    from tensorflow.keras.optimizers import SGD
+    from keras.layers import Dense, Dropout
+    from keras.models import Sequential
 
-training = []
-output_empty = [0] * len(classes)
-for doc in documents:
-    
-    bag = []
-    
-    pattern_words = doc[0]
-    # lemmatize each word - create base word, in attempt to represent related words
-    pattern_words = [lemmatizer.lemmatize(word.lower()) for word in pattern_words]
-    # create our bag of words array with 1, if word match found in current pattern
-    for w in words:
-        bag.append(1) if w in pattern_words else bag.append(0)
+    model = Sequential()
+    for i, units in enumerate(hidden):
+        if i == 0:
+            model.add(Dense(units, input_shape=(input_dim,), activation="relu"))
+        else:
+            model.add(Dense(units, activation="relu"))
+        model.add(Dropout(dropout))
+    model.add(Dense(output_dim, activation="softmax"))
+
+    sgd = SGD(learning_rate=learning_rate, decay=1e-6, momentum=0.9, nesterov=True)
+    model.compile(loss="categorical_crossentropy", optimizer=sgd, metrics=["accuracy"])
+    return model
+
+
+def save_outputs(words, classes, training, model, hist=None):
+    pickle.dump(words, open("words.pkl", "wb"))
+    pickle.dump(classes, open("classes.pkl", "wb"))
+    # packed bag-of-words index over every pattern, used by the low-confidence fallback
+    build_index(INDEX_PATH, [t[0] for t in training], [t[1].index(1) for t in training], words, classes)
+    model.save("chatbot_model.h5", hist)
+    export_model(ARTIFACT_PATH, words, classes, model)
+
+
+def split_validation(training, fraction, seed):
+    # per class, so every intent keeps at least one training pattern
+    rng = random.Random(seed)
+    by_class = {}
+    for row in training:
+        by_class.setdefault(row[1].index(1), []).append(row)
+    train, val = [], []
+    for rows in by_class.values():
+        rng.shuffle(rows)
+        n_val = min(int(round(len(rows) * fraction)), len(rows) - 1)
+        val.extend(rows[:n_val])
+        train.extend(rows[n_val:])
+    rng.shuffle(train)
+    return train, val
+
+
+def sweep_configs(search, trials, seed):
+    keys = list(SWEEP_GRID)
+    configs = [dict(zip(keys, values)) for values in itertools.product(*(SWEEP_GRID[k] for k in keys))]
+    if search == "random" and trials < len(configs):
+        configs = random.Random(seed).sample(configs, trials)
+    return configs
+
+
+def run_trial(config, train, val, words, classes, max_epochs, patience, seed):
+    # one trial per process; keep TensorFlow to a single core so trials do not fight over CPUs
+    import tensorflow
+    from keras.callbacks import EarlyStopping
+    tensorflow.config.threading.set_intra_op_parallelism_threads(1)
+    tensorflow.config.threading.set_inter_op_parallelism_threads(1)
+    tensorflow.random.set_seed(seed)
+
+    train_x = np.array([t[0] for t in train])
+    train_y = np.array([t[1] for t in train])
+    val_x = np.array([t[0] for t in val])
+    val_y = np.array([t[1] for t in val])
+    model = build_model(len(words), len(classes), config["hidden"], config["dropout"], config["learning_rate"])
+    stop = EarlyStopping(monitor="val_loss", patience=patience, restore_best_weights=True)
+    start = time.perf_counter()
+    hist = model.fit(train_x, train_y, epochs=max_epochs, batch_size=config["batch_size"],
+                     validation_data=(val_x, val_y), callbacks=[stop], verbose=0)
+    train_seconds = time.perf_counter() - start
+    val_loss, val_accuracy = model.evaluate(val_x, val_y, verbose=0)
+
+    # inference cost as served: export to the mmap artifact and time a single-message predict
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.bin")
+        export_model(path, words, classes, model)
+        served = Artifact(path)
+        x = val_x[:1]
+        runs = 2000
+        start = time.perf_counter()
+        for _ in range(runs):
+            served.predict(x)
+        predict_us = (time.perf_counter() - start) / runs * 1e6
+        artifact_bytes = os.path.getsize(path)
+        del served
+
+    return {
+        "learning_rate": config["learning_rate"],
+        "dropout": config["dropout"],
+        "hidden": "x".join(str(u) for u in config["hidden"]),
+        "batch_size": config["batch_size"],
+        "best_epoch": int(np.argmin(hist.history["val_loss"])) + 1,
+        "val_accuracy": float(val_accuracy),
+        "val_loss": float(val_loss),
+        "train_seconds": train_seconds,
+        "parameters": int(model.count_params()),
+        "artifact_bytes": artifact_bytes,
+        "predict_us": predict_us,
+    }
+
+
+def sweep(words, classes, training, args):
+    train, val = split_validation(training, args.val_fraction, args.seed)
+    configs = sweep_configs(args.search, args.trials, args.seed)
+    print(len(configs), "configurations,", len(train), "train /", len(val), "validation patterns")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=args.sweep_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(run_trial, config, train, val, words, classes, args.epochs, args.patience, args.seed)
+                   for config in configs]
+        for config, future in zip(configs, futures):
+            result = future.result()
+            results.append((config, result))
+            print(f"{result['hidden']:>8} lr={result['learning_rate']:<6} dropout={result['dropout']:<4} "
+                  f"batch={result['batch_size']:<3} val_acc={result['val_accuracy']:.3f} "
+                  f"epoch={result['best_epoch']:<4} predict={result['predict_us']:.1f}us")
+
+    # best validation accuracy, then loss, compared in coarse buckets so that near-identical
+    # networks are ranked by how cheap they are to serve
+    results.sort(key=lambda r: (-round(r[1]["val_accuracy"], 2), round(r[1]["val_loss"], 1), r[1]["predict_us"]))
+    with open(args.results, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0][1]))
+        writer.writeheader()
+        writer.writerows(r for _, r in results)
+    print("results written to", args.results)
+
+    # retrain the winner on every pattern for the epoch count early stopping picked
+    config, best = results[0]
+    print("best:", best)
+    model = build_model(len(words), len(classes), config["hidden"], config["dropout"], config["learning_rate"])
+    hist = model.fit(np.array([t[0] for t in training]), np.array([t[1] for t in training]),
+                     epochs=best["best_epoch"], batch_size=config["batch_size"], verbose=0)
+    save_outputs(words, classes, training, model, hist)
+    print("model created")
 
-    # output is a '0' for each tag and '1' for current tag (for each pattern)
-    output_row = list(output_empty)
-    output_row[classes.index(doc[1])] = 1
 
-    training.append([bag, output_row])
-# shuffle our features and turn into np.array
-random.shuffle(training)
-training = np.array(training,dtype=object)
-# create train and test lists. X - patterns, Y - intents
-train_x = list(training[:, 0])
-train_y = list(training[:, 1])
-print("Training data created")
+def main(args):
+    download_nltk_data()
+    data_file = open("intents.json").read()
+    intents = json.loads(data_file)
 
+    documents = load_documents(intents, args.workers)
+    words, classes = build_vocabulary(documents)
 
-model = Sequential()
-model.add(Dense(128, input_shape=(len(train_x[0]),), activation="relu"))
-model.add(Dropout(0.5))
-model.add(Dense(64, activation="relu"))
-model.add(Dropout(0.5))
-model.add(Dense(len(train_y[0]), activation="softmax"))
-model.summary()
+    print(len(documents), "documents")
 
+    print(len(classes), "classes", classes)
 
-sgd = SGD(learning_rate=0.001, decay=1e-6, momentum=0.9, nesterov=True)
-model.compile(loss="categorical_crossentropy", optimizer=sgd, metrics=["accuracy"])
+    print(len(words), "unique lemmatized words", words)
 
+    training = build_training(documents, words, classes)
+    print("Training data created")
 
-hist = model.fit(np.array(train_x), np.array(train_y), epochs=200, batch_size=5, verbose=1)
-model.save("chatbot_model.h5", hist)
-print("model created")
+    if args.sweep:
+        sweep(words, classes, training, args)
+        return
 
+    model = build_model(len(words), len(classes))
+    model.summary()
+    # shuffle our features and turn into np.array
+    shuffled = list(training)
+    random.shuffle(shuffled)
+    train_x = np.array([t[0] for t in shuffled])
+    train_y = np.array([t[1] for t in shuffled])
+    hist = model.fit(train_x, train_y, epochs=args.epochs, batch_size=5, verbose=1)
+    save_outputs(words, classes, training, model, hist)
+    print("model created")
 
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the chatbot intent classifier")
+    parser.add_argument("--sweep", action="store_true", help="run a hyperparameter sweep and keep the best model")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid")
+    parser.add_argument("--trials", type=int, default=12, help="configurations to sample with --search random")
+    parser.add_argument("--workers", type=int, default=1, help="processes for NLTK preprocessing")
+    parser.add_argument("--sweep-workers", type=int, default=os.cpu_count() or 1, help="processes running sweep trials")
+    parser.add_argument("--epochs", type=int, default=200, help="epochs, or the early stopping cap with --sweep")
+    parser.add_argument("--patience", type=int, default=20)
+    parser.add_argument("--val-fraction", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", default="sweep_results.csv")
+    main(parser.parse_args())